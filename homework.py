@@ -2,17 +2,29 @@ import exceptions
 import logging
 import os
 import requests
+import socket
 import telegram
 import time
+import types
 
 from dotenv import load_dotenv
 from http import HTTPStatus
+from logging.handlers import RotatingFileHandler
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-handler = logging.FileHandler('x.log', encoding='utf-8')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+handler = RotatingFileHandler(
+    'x.log',
+    maxBytes=1_000_000,
+    backupCount=3,
+    encoding='utf-8',
+    delay=True,
+)
 logger.addHandler(handler)
 formatter = logging.Formatter(
     '%(asctime)s - %(levelname)s - %(message)s - %(lineno)d'
@@ -25,86 +37,166 @@ TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
 RETRY_TIME = 600
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
-HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+HEADERS = types.MappingProxyType(
+    {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+)
+TIMEOUT = (5, 30)
+REQUEST_TEMPLATE = '%s, %s, %s'
+REQUEST_LOG = 'Начинаем запрос к API: ' + REQUEST_TEMPLATE
+KEEPALIVE_IDLE = 60
+
+SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+if hasattr(socket, 'TCP_KEEPIDLE'):
+    SOCKET_OPTIONS.append(
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    )
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter, включающий TCP keepalive на сокетах пула."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Передает пулу соединений опции сокета с keepalive."""
+        kwargs['socket_options'] = SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+
+SESSION = requests.Session()
+SESSION.mount(
+    'https://', KeepAliveAdapter(pool_connections=1, pool_maxsize=2)
+)
+SESSION.headers.update(HEADERS)
+LAST_RESPONSE = {'from_date': None, 'validators': {}, 'body': None}
 
 HOMEWORK_VERDICTS = {
     'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
     'reviewing': 'Работа взята на проверку ревьюером.',
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
+MESSAGES = {
+    status: 'Изменился статус проверки работы "%s". ' + verdict
+    for status, verdict in HOMEWORK_VERDICTS.items()
+}
+NO_NEW_STATUSES = 'Нет новых статусов.'
+
+STATUS_ERROR = (
+    'API возвращает код, отличный от 200. '
+    'Код ответа: %s. Причина: %s. Текст: %s.'
+)
+REQUEST_ERROR = (
+    'Сбой в програме при запросе API: "%s". '
+    'Запрос к API: %s. Ответ API: "%s".'
+)
 
 
 def send_message(bot, message):
     """Отправляет сообщние в Telegram чат."""
     try:
-        logger.info(f'Бот начинает отправку сообщения: "{message}"')
+        logger.info('Бот начинает отправку сообщения: "%s"', message)
         bot.send_message(TELEGRAM_CHAT_ID, message)
     except telegram.error.TelegramError as error:
         logger.error(
-            f'Сбой при отправке сообщения в Telegram: "{error}"'
+            'Сбой при отправке сообщения в Telegram: "%s"', error
         )
     else:
-        logger.info(
-            f'Бот отправил сообщение: "{message}"'
-        )
+        logger.info('Бот отправил сообщение: "%s"', message)
+
+
+def send_if_changed(bot, message, last_message):
+    """Отправляет сообщение, если оно отличается от предыдущего."""
+    if message != last_message:
+        send_message(bot, message)
+    return message
+
+
+def format_request(request_args):
+    """Форматирует параметры запроса к API для сообщения об ошибке."""
+    return REQUEST_TEMPLATE % (
+        request_args['url'],
+        request_args['headers'],
+        request_args['params'],
+    )
 
 
 def get_api_answer(current_timestamp):
     """Делает запрос к единственному эндпоинту API-сервиса."""
-    timestamp = current_timestamp
-    params = {'from_date': timestamp}
+    params = {'from_date': current_timestamp}
+    validators = {}
+    if LAST_RESPONSE['from_date'] == current_timestamp:
+        validators = LAST_RESPONSE['validators']
     request_args = {
         'url': ENDPOINT,
-        'headers': HEADERS,
+        'headers': {**HEADERS, **validators},
         'params': params,
+        'timeout': TIMEOUT,
     }
     try:
         logger.info(
-            f'Начинаем запрос к API: '
-            f'{"{url}, {headers}, {params}".format(**request_args)}'
+            REQUEST_LOG,
+            request_args['url'],
+            request_args['headers'],
+            request_args['params'],
         )
-        homework_statuses = requests.get(**request_args)
+        homework_statuses = SESSION.get(**request_args)
+        if (
+            homework_statuses.status_code == HTTPStatus.NOT_MODIFIED
+            and validators
+        ):
+            logger.info('Ответ API не изменился.')
+            return LAST_RESPONSE['body']
         if homework_statuses.status_code != HTTPStatus.OK:
-            raise exceptions.HTTPstatusNot200(
-                f'API возвращает код, отличный от 200. '
-                f'Код ответа: {homework_statuses.status_code}. '
-                f'Причина: {homework_statuses.reason}. '
-                f'Текст: {homework_statuses.text}.'
-            )
+            raise exceptions.HTTPstatusNot200(STATUS_ERROR % (
+                homework_statuses.status_code,
+                homework_statuses.reason,
+                homework_statuses.text,
+            ))
         logger.info('Ответ от API пришел.')
-        return homework_statuses.json()
+        response = homework_statuses.json()
+        validators = {
+            condition: homework_statuses.headers[header]
+            for header, condition in (
+                ('ETag', 'If-None-Match'),
+                ('Last-Modified', 'If-Modified-Since'),
+            )
+            if header in homework_statuses.headers
+        }
+        LAST_RESPONSE.update(
+            from_date=current_timestamp,
+            validators=validators,
+            body=response,
+        )
+        return response
     except Exception as error:
         raise ConnectionError(
-            f'Сбой в програме при запросе API: "{error}". '
-            f'Запрос к API: '
-            f'{"{url}, {headers}, {params}".format(**request_args)}. '
-            f'Ответ API: "{error}".'
+            REQUEST_ERROR % (error, format_request(request_args), error)
         )
 
 
 def check_response(response):
     """Проверяет ответ API на корректность."""
-    logger.info('Начало проверки ответа API.')
+    logger.debug('Начало проверки ответа API.')
     if not isinstance(response, dict):
         raise TypeError(
             'Возвращаемый ответ не словарь.'
         )
-    if 'homeworks' not in response:
+    homeworks = response.get('homeworks')
+    if homeworks is None:
         raise exceptions.EmptyResponseFromAPI(
             'Домашней работы нет в ответе.'
         )
-    homeworks = response.get('homeworks')
     if not isinstance(homeworks, list):
         raise exceptions.HomeworksIsNotList(
             'Возвращаемая домашняя работа не список.'
         )
-    logger.info('Ответ API проверен.')
+    logger.debug('Ответ API проверен.')
     return homeworks
 
 
 def parse_status(homework):
     """Извлекает статус домашней работы."""
-    logger.info('Начало извлечения статуса домашней работы.')
+    logger.debug('Начало извлечения статуса домашней работы.')
     if 'homework_name' not in homework:
         raise KeyError(
             'Ключ "homework_name" отсутствует в домашней работе.'
@@ -115,11 +207,36 @@ def parse_status(homework):
         raise KeyError(
             'Неожиданный статус домашней работы.'
         )
-    logger.info('Статус домашней работы извлечен.')
-    return (
-        f'Изменился статус проверки работы "{homework_name}". '
-        f'{HOMEWORK_VERDICTS[homework_status]}'
-    )
+    logger.debug('Статус домашней работы извлечен.')
+    return MESSAGES[homework_status] % homework_name
+
+
+def filter_new_statuses(homeworks, statuses):
+    """Отбирает домашние работы, статус которых изменился."""
+    return [
+        homework for homework in homeworks
+        if statuses.get(homework.get('homework_name'))
+        != homework.get('status')
+    ]
+
+
+def parse_new_statuses(homeworks, statuses):
+    """Готовит сообщения о новых статусах домашних работ.
+
+    Ошибка разбора одной работы не мешает остальным: она попадает
+    в отдельный список, а статус работы запоминается, чтобы не
+    сообщать о нем повторно.
+    """
+    messages = []
+    errors = []
+    for homework in filter_new_statuses(homeworks, statuses):
+        try:
+            messages.append(parse_status(homework))
+        except KeyError as error:
+            logger.error(error)
+            errors.append(str(error))
+        statuses[homework.get('homework_name')] = homework.get('status')
+    return messages, errors
 
 
 def check_tokens():
@@ -133,56 +250,54 @@ def check_tokens():
         if token is None:
             is_tokens_available = False
             logger.critical(
-                f'Отсутствует обязательная переменная '
-                f'окружения: "{name}". '
-                f'Программа принудительно остановлена.'
+                'Отсутствует обязательная переменная '
+                'окружения: "%s". '
+                'Программа принудительно остановлена.',
+                name,
             )
     return is_tokens_available
 
 
-def main():
+def main(bot=None):
     """Основная логика работы бота."""
     if not check_tokens():
         raise exceptions.NoToken(
             'Отсутствуют обязательные переменные окружения'
         )
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    current_timestamp = int(time.time())
-    current_report = {'name': '', 'output': ''}
-    prev_report = {'name': '', 'output': ''}
+    bot = bot or telegram.Bot(token=TELEGRAM_TOKEN)
+    current_timestamp = time.time_ns() // 10**9
+    statuses = {}
+    last_message = ''
 
     while True:
+        next_tick = time.monotonic() + RETRY_TIME
         try:
             response = get_api_answer(current_timestamp)
             homeworks = check_response(response)
 
-            if homeworks:
-                current_report['output'] = parse_status(homeworks[0])
-                current_report['name'] = homeworks[0]['homework_name']
-            else:
-                current_report['output'] = 'Нет новых статусов.'
+            messages, errors = parse_new_statuses(homeworks, statuses)
+            if not homeworks and last_message != NO_NEW_STATUSES:
+                messages.append(NO_NEW_STATUSES)
+            for message in messages + errors:
+                send_message(bot, message)
+                last_message = message
 
-            if current_report != prev_report:
-                send_message(bot, current_report['output'])
-                prev_report = current_report.copy()
+            if not messages and not errors:
+                logger.info('Новые статусы отсутствуют.')
+            elif not errors:
                 current_timestamp = response.get(
                     'current_date', current_timestamp
                 )
-            else:
-                logger.info('Новые статусы отсутствуют.')
 
         except exceptions.EmptyResponseFromAPI as error:
             logger.error(error)
 
         except Exception as error:
             logger.error(error)
-            current_report['output'] = error
-            if current_report != prev_report:
-                send_message(bot, current_report['output'])
-                prev_report = current_report.copy()
+            last_message = send_if_changed(bot, str(error), last_message)
 
         finally:
-            time.sleep(RETRY_TIME)
+            time.sleep(max(0.0, next_tick - time.monotonic()))
 
 
 if __name__ == '__main__':
@@ -1,7 +1,6 @@
 import os
 from http import HTTPStatus
 
-import requests
 import telegram
 import utils
 
@@ -44,6 +43,7 @@ class MockResponseGET:
         )
         self.random_timestamp = random_timestamp
         self.status_code = http_status
+        self.headers = {}
 
     def json(self):
         data = {
@@ -73,6 +73,61 @@ class MockTelegramBot:
         return self.random_timestamp
 
 
+class RecordingTelegramBot(MockTelegramBot):
+
+    def __init__(self, **kwargs):
+        super().__init__(token='1234:abcdefg', **kwargs)
+        self.sent = []
+
+    def send_message(self, chat_id=None, text=None, **kwargs):
+        self.sent.append(text)
+        return super().send_message(chat_id, text, **kwargs)
+
+
+class StopPolling(Exception):
+    pass
+
+
+def run_main(monkeypatch, answers, start_timestamp):
+    """Runs homework.main() over scripted API answers, one per poll.
+
+    Returns the messages sent by the bot, the `from_date` of every poll
+    and the number of sleeps between polls.
+    """
+    import homework
+
+    answers = list(answers)
+    timestamps = []
+    sleeps = []
+
+    def mock_get_api_answer(current_timestamp):
+        timestamps.append(current_timestamp)
+        answer = answers[len(timestamps) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def mock_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == len(answers):
+            raise StopPolling
+
+    monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', 'sometoken')
+    monkeypatch.setattr(homework, 'TELEGRAM_TOKEN', '1234:abcdefg')
+    monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 12345)
+    monkeypatch.setattr(homework, 'get_api_answer', mock_get_api_answer)
+    monkeypatch.setattr(homework.time, 'time_ns',
+                        lambda: start_timestamp * 10**9)
+    monkeypatch.setattr(homework.time, 'sleep', mock_sleep)
+
+    bot = RecordingTelegramBot()
+    try:
+        homework.main(bot)
+    except StopPolling:
+        pass
+    return bot.sent, timestamps, len(sleeps)
+
+
 class TestHomework:
     HOMEWORK_STATUSES = {
         'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -186,7 +241,7 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -232,7 +287,7 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_500_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_500_response_get)
 
         import homework
 
@@ -247,6 +302,151 @@ class TestHomework:
                 'когда API возвращает код, отличный от 200'
             )
 
+    def test_get_304_api_answer_without_cache(self, monkeypatch,
+                                              random_timestamp,
+                                              current_timestamp, api_url):
+        def mock_304_response_get(*args, **kwargs):
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp,
+                http_status=HTTPStatus.NOT_MODIFIED, **kwargs
+            )
+
+            def json_invalid():
+                raise ValueError('Тело ответа 304 пустое')
+
+            response.json = json_invalid
+            return response
+
+        import homework
+
+        monkeypatch.setattr(homework, 'LAST_RESPONSE', {
+            'from_date': None, 'validators': {}, 'body': None
+        })
+        monkeypatch.setattr('homework.SESSION.get', mock_304_response_get)
+
+        func_name = 'get_api_answer'
+        try:
+            homework.get_api_answer(current_timestamp)
+        except:
+            pass
+        else:
+            assert False, (
+                f'Убедитесь, что функция `{func_name}` не выдумывает ответ '
+                'при коде 304, если предыдущий ответ API не сохранен'
+            )
+
+    def test_get_api_answer_conditional_headers(self, monkeypatch,
+                                                random_timestamp,
+                                                current_timestamp, api_url):
+        sent_headers = []
+        body = {
+            'homeworks': [{'homework_name': 'hw123', 'status': 'approved'}],
+            'current_date': random_timestamp,
+        }
+
+        def mock_response_get(*args, **kwargs):
+            sent_headers.append(kwargs['headers'])
+            modified = 'If-None-Match' not in kwargs['headers']
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=kwargs['params']['from_date'],
+                http_status=(
+                    HTTPStatus.OK if modified else HTTPStatus.NOT_MODIFIED
+                ),
+                **kwargs
+            )
+            response.headers = {
+                'ETag': '"v1"',
+                'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            }
+            response.json = lambda: body
+            return response
+
+        import homework
+
+        monkeypatch.setattr(homework, 'LAST_RESPONSE', {
+            'from_date': None, 'validators': {}, 'body': None
+        })
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
+
+        func_name = 'get_api_answer'
+        assert homework.get_api_answer(current_timestamp) == body
+        assert 'If-None-Match' not in sent_headers[0]
+        assert 'If-Modified-Since' not in sent_headers[0]
+
+        result = homework.get_api_answer(current_timestamp)
+        assert sent_headers[1]['If-None-Match'] == '"v1"', (
+            f'Проверьте, что функция `{func_name}` передает ETag '
+            'прошлого ответа в заголовке If-None-Match'
+        )
+        assert sent_headers[1]['If-Modified-Since'] == (
+            'Wed, 21 Oct 2015 07:28:00 GMT'
+        ), (
+            f'Проверьте, что функция `{func_name}` передает Last-Modified '
+            'прошлого ответа в заголовке If-Modified-Since'
+        )
+        assert result == body, (
+            f'Проверьте, что функция `{func_name}` при ответе 304 '
+            'возвращает сохраненный ответ API'
+        )
+
+        homework.get_api_answer(current_timestamp + 1)
+        assert 'If-None-Match' not in sent_headers[2], (
+            f'Проверьте, что функция `{func_name}` не передает валидаторы '
+            'при запросе с другим from_date'
+        )
+        assert 'If-Modified-Since' not in sent_headers[2]
+
+    def test_get_304_api_answer_keeps_invalid_status(self, monkeypatch,
+                                                     random_timestamp,
+                                                     current_timestamp,
+                                                     api_url):
+        def mock_response_get(*args, **kwargs):
+            modified = 'If-None-Match' not in kwargs['headers']
+            response = MockResponseGET(
+                *args, random_timestamp=random_timestamp,
+                current_timestamp=current_timestamp,
+                http_status=(
+                    HTTPStatus.OK if modified else HTTPStatus.NOT_MODIFIED
+                ),
+                **kwargs
+            )
+            response.headers = {'ETag': '"v1"'}
+
+            def json_body():
+                assert modified, 'Тело ответа 304 пустое'
+                return {
+                    'homeworks': [
+                        {'homework_name': 'hw123', 'status': 'unknown'}
+                    ],
+                    'current_date': random_timestamp,
+                }
+
+            response.json = json_body
+            return response
+
+        import homework
+
+        monkeypatch.setattr(homework, 'LAST_RESPONSE', {
+            'from_date': None, 'validators': {}, 'body': None
+        })
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
+
+        for _ in range(2):
+            response = homework.get_api_answer(current_timestamp)
+            homeworks = homework.check_response(response)
+            try:
+                for hw in homeworks:
+                    homework.parse_status(hw)
+            except KeyError:
+                pass
+            else:
+                assert False, (
+                    'Убедитесь, что ответ 304 не скрывает ошибку '
+                    'в ранее полученном ответе API'
+                )
+
     def test_parse_status(self, random_timestamp):
         test_data = {
             "id": 123,
@@ -291,6 +491,98 @@ class TestHomework:
             f'`{status}` в возврате функции parse_status()'
         )
 
+    def test_filter_new_statuses(self):
+        import homework
+
+        func_name = 'filter_new_statuses'
+        utils.check_function(homework, func_name, 2)
+
+        homeworks = [
+            {'homework_name': 'hw1', 'status': 'approved'},
+            {'homework_name': 'hw2', 'status': 'reviewing'},
+            {'homework_name': 'hw3', 'status': 'rejected'},
+        ]
+        statuses = {'hw1': 'approved', 'hw2': 'rejected'}
+        result = homework.filter_new_statuses(homeworks, statuses)
+        assert result == homeworks[1:], (
+            f'Проверьте, что функция `{func_name}` возвращает только '
+            'домашние работы с изменившимся или новым статусом'
+        )
+
+    def test_main_statuses_and_from_date(self, monkeypatch,
+                                         random_timestamp):
+        import homework
+
+        start = random_timestamp
+        hw_unknown = {'homework_name': 'hw1', 'status': 'unknown'}
+        hw_approved = {'homework_name': 'hw2', 'status': 'approved'}
+        hw_reviewing = {'homework_name': 'hw1', 'status': 'reviewing'}
+        hw_rejected = {'homework_name': 'hw3', 'status': 'rejected'}
+        batch = {
+            'homeworks': [hw_unknown, hw_approved],
+            'current_date': start + 1,
+        }
+        answers = [
+            batch,
+            batch,
+            {
+                'homeworks': [hw_approved, hw_reviewing, hw_rejected],
+                'current_date': start + 2,
+            },
+            {'homeworks': [], 'current_date': start + 3},
+        ]
+        sent, timestamps, sleeps = run_main(monkeypatch, answers, start)
+
+        assert sent[0] == homework.parse_status(hw_approved), (
+            'Убедитесь, что домашняя работа с неожиданным статусом '
+            'не мешает отправить остальные работы из ответа API'
+        )
+        assert sent[1] == str(KeyError('Неожиданный статус домашней работы.'))
+        assert sent[2:] == [
+            homework.parse_status(hw_reviewing),
+            homework.parse_status(hw_rejected),
+            homework.NO_NEW_STATUSES,
+        ], (
+            'Убедитесь, что уже отправленные статусы не отправляются '
+            'повторно при повторном чтении ответа API'
+        )
+        assert timestamps == [start, start, start, start + 2], (
+            'Убедитесь, что `from_date` не сдвигается, пока ответ API '
+            'обработан не полностью, и сдвигается один раз после '
+            'успешной обработки'
+        )
+        assert sleeps == len(answers), (
+            'Убедитесь, что бот делает паузу после каждого запроса к API, '
+            'в том числе когда новых статусов нет'
+        )
+
+    def test_main_deduplicates_messages(self, monkeypatch,
+                                        random_timestamp):
+        import homework
+
+        start = random_timestamp
+        hw_approved = {'homework_name': 'hw1', 'status': 'approved'}
+        answers = [
+            ConnectionError('Сбой API'),
+            ConnectionError('Сбой API'),
+            {'homeworks': [hw_approved], 'current_date': start + 1},
+            ConnectionError('Сбой API'),
+            {'homeworks': [], 'current_date': start + 2},
+            {'homeworks': [], 'current_date': start + 3},
+        ]
+        sent, _, _ = run_main(monkeypatch, answers, start)
+
+        assert sent == [
+            'Сбой API',
+            homework.parse_status(hw_approved),
+            'Сбой API',
+            homework.NO_NEW_STATUSES,
+        ], (
+            'Убедитесь, что одинаковая ошибка подряд отправляется один раз, '
+            'повторяется после другого сообщения, а сообщение об отсутствии '
+            'новых статусов не дублируется'
+        )
+
     def test_check_response(self, monkeypatch, random_timestamp,
                             current_timestamp, api_url):
         def mock_response_get(*args, **kwargs):
@@ -315,7 +607,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -352,7 +644,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -400,7 +692,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -448,7 +740,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -484,7 +776,7 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_no_homeworks_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_no_homeworks_response_get)
 
         import homework
 
@@ -525,7 +817,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -565,7 +857,7 @@ class TestHomework:
             response.json = valid_response_json
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 
@@ -599,7 +891,7 @@ class TestHomework:
             response.json = json_invalid
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_empty_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_empty_response_get)
 
         import homework
 
@@ -626,7 +918,7 @@ class TestHomework:
             )
             return response
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr('homework.SESSION.get', mock_response_get)
 
         import homework
 